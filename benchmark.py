@@ -0,0 +1,69 @@
+import math
+import time
+
+import raycasting
+from geometry import Point
+
+
+def timed(function):
+    # CPU time rather than wall time, it's much less noisy on a busy machine
+    start = time.process_time()
+    function()
+    return time.process_time() - start
+
+
+def compare(name, scene, views, repeats=10):
+    rays = repeats * sum(width for _, width in views)
+
+    def batch():
+        for _ in range(repeats):
+            raycasting.cast_views(scene, views, depth_only=True)
+
+    def one_at_a_time():
+        for _ in range(repeats):
+            for view in views:
+                raycasting.cast_views(scene, [view], depth_only=True)
+
+    # Interleave the two so they see the same machine load, and keep the best
+    batch_time, one_at_a_time_time = math.inf, math.inf
+    for _ in range(20):
+        batch_time = min(batch_time, timed(batch))
+        one_at_a_time_time = min(one_at_a_time_time, timed(one_at_a_time))
+
+    print(
+        f"{name}: batch {rays / batch_time:.0f} rays/s, "
+        f"one at a time {rays / one_at_a_time_time:.0f} rays/s"
+    )
+
+
+def main():
+    # The same map as the demo in raycasting.main
+    scene = raycasting.Scene(raycasting.make_map(raycasting.GAME_MAP))
+
+    # Four split-screen players, standing in open cells of the map
+    players = [
+        (raycasting.Camera(location, direction, math.pi / 2), 320)
+        for location, direction in (
+            (Point(8.5, 11.5), math.pi / 2),
+            (Point(12.5, 11.5), 3 * math.pi / 2),
+            (Point(6.5, 2.5), 0),
+            (Point(17.5, 2.5), math.pi / 4),
+        )
+    ]
+    compare("4 players at 320px", scene, players)
+
+    # Lots of small agent cameras looking around the top corridor
+    agents = [
+        (
+            raycasting.Camera(
+                Point(6.5 + (i % 8), 11.5), i * math.pi / 16, math.pi / 2
+            ),
+            64,
+        )
+        for i in range(32)
+    ]
+    compare("32 agents at 64px", scene, agents)
+
+
+if __name__ == "__main__":
+    main()
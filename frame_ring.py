@@ -0,0 +1,172 @@
+import struct
+import sys
+import time
+import typing
+from multiprocessing import resource_tracker, shared_memory
+
+# Ring header: slots, width, height, frames written, frames read, frames dropped
+RING_HEADER = struct.Struct("<IIIxxxxQQQ")
+
+# Each count is only ever written by one side, so they're updated one at a time
+WRITTEN_OFFSET = 16
+READ_OFFSET = 24
+DROPPED_OFFSET = 32
+COUNT = struct.Struct("<Q")
+
+# Slot header: frame number, camera x, camera y, camera direction, timestamp
+SLOT_HEADER = struct.Struct("<Qdddd")
+
+# Frames are stored as packed RGB, as returned by pygame.image.tobytes
+CHANNELS = 3
+
+# Names of the rings created by writers in this process
+_created = set()
+
+
+class Frame(typing.NamedTuple):
+    frame: int
+    x: float
+    y: float
+    direction: float
+    timestamp: float
+    pixels: memoryview
+
+
+class FrameRing:
+    """
+    A ring of frame slots in shared memory, for handing rendered frames to
+    another process (a video encoder, a training data writer, ...).
+
+    There is one writer and one reader. The writer never waits for the
+    reader: when every slot is still waiting to be read, the new frame is
+    dropped and counted instead.
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory):
+        self.memory = memory
+        self.slots, self.width, self.height = RING_HEADER.unpack_from(memory.buf)[:3]
+        self.frame_size = self.width * self.height * CHANNELS
+        self.slot_size = SLOT_HEADER.size + self.frame_size
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def _counts(self):
+        return RING_HEADER.unpack_from(self.memory.buf)[3:]
+
+    @property
+    def dropped(self):
+        return self._counts()[2]
+
+    def _slot_offset(self, index):
+        return RING_HEADER.size + (index % self.slots) * self.slot_size
+
+    def close(self):
+        # Any Frame.pixels handed out by read() must be released first
+        self.memory.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameRingWriter(FrameRing):
+    def __init__(self, width, height, slots=8, name=None):
+        memory = shared_memory.SharedMemory(
+            name,
+            create=True,
+            size=RING_HEADER.size
+            + slots * (SLOT_HEADER.size + width * height * CHANNELS),
+        )
+        RING_HEADER.pack_into(memory.buf, 0, slots, width, height, 0, 0, 0)
+        _created.add(memory.name)
+        super().__init__(memory)
+
+    @property
+    def full(self):
+        """
+        True if every slot is waiting to be read, so the next frame would be
+        dropped. Check this before going to the trouble of making the frame.
+        """
+        written, read, _ = self._counts()
+        return written - read >= self.slots
+
+    def drop(self):
+        """Count a frame that was never written, because the ring was full"""
+        COUNT.pack_into(self.memory.buf, DROPPED_OFFSET, self.dropped + 1)
+
+    def write(self, pixels, frame, camera, timestamp=None) -> bool:
+        """
+        Copy `pixels` (packed RGB) into the next free slot, returning False
+        if the frame was dropped because the reader is behind
+        """
+        if len(pixels) != self.frame_size:
+            raise ValueError(
+                f"Expected {self.frame_size} bytes of pixels, got {len(pixels)}"
+            )
+
+        written, read, _ = self._counts()
+
+        if written - read >= self.slots:
+            self.drop()
+            return False
+
+        offset = self._slot_offset(written)
+        SLOT_HEADER.pack_into(
+            self.memory.buf,
+            offset,
+            frame,
+            camera.location.x,
+            camera.location.y,
+            camera.direction,
+            time.time() if timestamp is None else timestamp,
+        )
+        start = offset + SLOT_HEADER.size
+        self.memory.buf[start : start + self.frame_size] = pixels
+
+        # Only publish the slot once it's completely written
+        COUNT.pack_into(self.memory.buf, WRITTEN_OFFSET, written + 1)
+        return True
+
+    def unlink(self):
+        _created.discard(self.memory.name)
+        self.memory.unlink()
+
+
+class FrameRingReader(FrameRing):
+    def __init__(self, name):
+        # The writer owns the memory, don't let this process's resource
+        # tracker unlink it when the reader exits
+        if sys.version_info >= (3, 13):
+            memory = shared_memory.SharedMemory(name, track=False)
+        else:
+            memory = shared_memory.SharedMemory(name)
+            if memory.name not in _created:
+                resource_tracker.unregister(memory._name, "shared_memory")
+
+        super().__init__(memory)
+
+    def read(self) -> Frame | None:
+        """
+        The oldest unread frame, or None if there isn't one. The pixels are a
+        view straight into shared memory, valid until release() is called.
+        """
+        written, read, _ = self._counts()
+        if read == written:
+            return None
+
+        offset = self._slot_offset(read)
+        start = offset + SLOT_HEADER.size
+        return Frame(
+            *SLOT_HEADER.unpack_from(self.memory.buf, offset),
+            self.memory.buf[start : start + self.frame_size],
+        )
+
+    def release(self):
+        """Hand the slot returned by the last read() back to the writer"""
+        written, read, _ = self._counts()
+        if read < written:
+            COUNT.pack_into(self.memory.buf, READ_OFFSET, read + 1)
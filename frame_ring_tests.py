@@ -0,0 +1,58 @@
+import geometry
+import math
+
+import frame_ring
+import raycasting
+
+
+def test_frames_round_trip():
+    camera = raycasting.Camera(geometry.Point(1, 2), math.pi, math.pi / 2)
+
+    with frame_ring.FrameRingWriter(4, 2, slots=2) as writer:
+        with frame_ring.FrameRingReader(writer.name) as reader:
+            assert reader.read() is None
+
+            assert writer.write(bytes(range(24)), 7, camera, timestamp=1.5)
+
+            frame = reader.read()
+            assert frame[:5] == (7, 1, 2, math.pi, 1.5)
+            assert frame.pixels.tobytes() == bytes(range(24))
+
+            # the pixels are a view of the slot, not a copy
+            start = writer._slot_offset(0) + frame_ring.SLOT_HEADER.size
+            frame.pixels[0] = 255
+            assert writer.memory.buf[start] == 255
+            frame.pixels.release()
+            reader.release()
+
+            assert reader.read() is None
+
+        writer.unlink()
+
+
+def test_writer_drops_frames_when_reader_is_behind():
+    camera = raycasting.Camera(geometry.Point(0, 0), 0, math.pi / 2)
+
+    with frame_ring.FrameRingWriter(1, 1, slots=2) as writer:
+        with frame_ring.FrameRingReader(writer.name) as reader:
+            results = [writer.write(bytes([i] * 3), i, camera) for i in range(5)]
+            assert results == [True, True, False, False, False]
+            assert reader.dropped == 3
+
+            # a full ring can be checked before making the frame at all
+            assert writer.full
+            writer.drop()
+            assert reader.dropped == 4
+
+            for expected in (0, 1):
+                frame = reader.read()
+                assert frame.frame == expected
+                frame.pixels.release()
+                reader.release()
+
+            assert reader.read() is None
+            assert not writer.full
+            assert writer.write(bytes(3), 5, camera)
+            assert reader.read().frame == 5
+
+        writer.unlink()
@@ -1,3 +1,4 @@
+import array
 import functools
 import dataclasses
 import typing
@@ -113,6 +114,59 @@ class Segment:
             + math.pi / 2,
         )
 
+    def length(self):
+        return math.dist(self.start, self.end)
+
+    def project(self, p: Point) -> float:
+        # How far along this segment p lies, 0 at start and 1 at end
+        d_x, d_y = self.end.x - self.start.x, self.end.y - self.start.y
+        return ((p.x - self.start.x) * d_x + (p.y - self.start.y) * d_y) / (
+            d_x * d_x + d_y * d_y
+        )
+
+    def collinear(self, other) -> bool:
+        d_x, d_y = self.end.x - self.start.x, self.end.y - self.start.y
+        tolerance = 0.0000001 * self.length()
+
+        for p in (other.start, other.end):
+            cross = d_x * (p.y - self.start.y) - d_y * (p.x - self.start.x)
+            if abs(cross) > tolerance:
+                return False
+
+        return True
+
+    def line(self):
+        # The infinite line through this segment, as a key that collinear
+        # segments share (give or take rounding), whichever way they point
+        d_x, d_y = self.end.x - self.start.x, self.end.y - self.start.y
+        length = math.hypot(d_x, d_y)
+        d_x, d_y = round(d_x / length, 6), round(d_y / length, 6)
+        if d_x < 0 or (d_x == 0 and d_y < 0):
+            d_x, d_y = -d_x, -d_y
+
+        return d_x, d_y, round(self.start.x * d_y - self.start.y * d_x, 6)
+
+    def contains(self, other) -> bool:
+        return (
+            self.collinear(other)
+            and self.in_bounds(other.start)
+            and self.in_bounds(other.end)
+        )
+
+    def translated(self, offset: Point):
+        return Segment(self.start + offset, self.end + offset)
+
+    def rotated(self, pivot: Point, angle):
+        # Clockwise, to match the "compass" angles used by Ray
+        def rotate(p: Point):
+            x, y = p.x - pivot.x, p.y - pivot.y
+            return Point(
+                pivot.x + x * math.cos(angle) + y * math.sin(angle),
+                pivot.y - x * math.sin(angle) + y * math.cos(angle),
+            )
+
+        return Segment(rotate(self.start), rotate(self.end))
+
 
 @dataclasses.dataclass
 class Ray:
@@ -145,3 +199,305 @@ def intersecting_segments(input_: Segment, segments):
             )
 
     return result
+
+
+class SegmentGrid:
+    """
+    Uniform grid of segments, used to only test the walls near a ray
+    instead of every wall in the map.
+
+    Each segment is registered in the cells it passes through (with a
+    little slack, so walls lying on cell edges land in both neighbours), so
+    adding or removing one only touches as many cells as it is long. Cells hold
+    the segment's end points unpacked, so casting doesn't have to go back
+    through Segment and Point for every test.
+    """
+
+    def __init__(self, cell_size=1.0):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.segments = {}
+
+        # Every segment added gets a new id, so callers can refer to walls
+        # by number. Ids aren't reused after a segment is removed.
+        self.next_id = 0
+        self.by_id = {}
+
+        # Bounds of every cell ever occupied, in cell coordinates. These only
+        # grow, which is fine as they're just used to clip rays.
+        self.min_cell = None
+        self.max_cell = None
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    def __contains__(self, segment):
+        return segment in self.segments
+
+    def _cells_around(self, min_x, min_y, max_x, max_y):
+        size = self.cell_size
+        min_cx = math.floor((min_x - 0.0000001) / size)
+        max_cx = math.floor((max_x + 0.0000001) / size)
+        min_cy = math.floor((min_y - 0.0000001) / size)
+        max_cy = math.floor((max_y + 0.0000001) / size)
+
+        return [
+            (cx, cy)
+            for cx in range(min_cx, max_cx + 1)
+            for cy in range(min_cy, max_cy + 1)
+        ]
+
+    def cells_for(self, segment: Segment):
+        # Horizontal and vertical walls (most of them) are already just a
+        # row or column of cells, and often lie right on a cell edge
+        if segment.min_x == segment.max_x or segment.min_y == segment.max_y:
+            return self._cells_around(
+                segment.min_x, segment.min_y, segment.max_x, segment.max_y
+            )
+
+        # Anything else walks the cells it passes through, the same way rays
+        # are cast, with the slack only around the end points
+        cells = dict.fromkeys(
+            self._cells_around(segment.start.x, segment.start.y, *segment.start)
+            + self._cells_around(segment.end.x, segment.end.y, *segment.end)
+        )
+
+        size = self.cell_size
+        x1, y1 = segment.start.x, segment.start.y
+        dx, dy = segment.end.x - x1, segment.end.y - y1
+
+        cx, cy = math.floor(x1 / size), math.floor(y1 / size)
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        t_delta_x, t_delta_y = size / abs(dx), size / abs(dy)
+        t_max_x = ((cx + (step_x > 0)) * size - x1) / dx
+        t_max_y = ((cy + (step_y > 0)) * size - y1) / dy
+
+        while True:
+            cells[(cx, cy)] = None
+
+            if min(t_max_x, t_max_y) > 1:
+                break
+
+            # Going right through a corner, take in the cells on both sides
+            if abs(t_max_x - t_max_y) < 0.0000001:
+                cells[(cx + step_x, cy)] = None
+                cells[(cx, cy + step_y)] = None
+
+            if t_max_x < t_max_y:
+                cx += step_x
+                t_max_x += t_delta_x
+            else:
+                cy += step_y
+                t_max_y += t_delta_y
+
+        return list(cells)
+
+    def add(self, segment: Segment):
+        if segment in self.segments:
+            return
+
+        cells = self.cells_for(segment)
+        entry = (
+            segment.start.x,
+            segment.start.y,
+            segment.end.x,
+            segment.end.y,
+            segment,
+            self.next_id,
+        )
+        self.next_id += 1
+        self.segments[segment] = (cells, entry)
+        self.by_id[entry[5]] = segment
+
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(entry)
+
+        low = (min(cx for cx, _ in cells), min(cy for _, cy in cells))
+        high = (max(cx for cx, _ in cells), max(cy for _, cy in cells))
+        if self.min_cell is None:
+            self.min_cell, self.max_cell = low, high
+        else:
+            self.min_cell = (
+                min(self.min_cell[0], low[0]),
+                min(self.min_cell[1], low[1]),
+            )
+            self.max_cell = (
+                max(self.max_cell[0], high[0]),
+                max(self.max_cell[1], high[1]),
+            )
+
+    def remove(self, segment: Segment):
+        cells, entry = self.segments.pop(segment)
+        del self.by_id[entry[5]]
+        for cell in cells:
+            contents = self.cells[cell]
+            contents.remove(entry)
+            if len(contents) == 0:
+                del self.cells[cell]
+
+    def segment_id(self, segment: Segment) -> int:
+        return self.segments[segment][1][5]
+
+    def near(self, segment: Segment):
+        """Every segment sharing a cell with the bounding box of `segment`"""
+        result = set()
+        for cell in self.cells_for(segment):
+            result.update(entry[4] for entry in self.cells.get(cell, ()))
+        return result
+
+    def closest_intersection(self, input_: Segment, hit_start=False):
+        """
+        The closest (distance, intersection, segment) along `input_` from its
+        start, or None if nothing is hit. See cast_into for hit_start.
+        """
+        distance = array.array("d", [math.inf])
+        hit_x, hit_y = array.array("d", [0]), array.array("d", [0])
+        segment_id = array.array("q", [-1])
+
+        self.cast_into(
+            input_.start.x,
+            input_.start.y,
+            [input_.end.x],
+            [input_.end.y],
+            distance,
+            hit_x,
+            hit_y,
+            segment_id,
+            hit_start,
+        )
+        if segment_id[0] == -1:
+            return None
+
+        return distance[0], Point(hit_x[0], hit_y[0]), self.by_id[segment_id[0]]
+
+    def cast_into(
+        self,
+        x,
+        y,
+        ends_x,
+        ends_y,
+        distance,
+        hit_x,
+        hit_y,
+        segment_id,
+        hit_start=False,
+    ):
+        """
+        Cast rays from (x, y) to each (ends_x[i], ends_y[i]), writing the
+        closest hit's distance, point and segment id into index i of the
+        output arrays. Rays that hit nothing leave their entries alone, so
+        fill the outputs with whatever "no hit" should look like first.
+
+        Walls touching the ray's start aren't counted as a hit at distance 0,
+        which is what looking out from a wall needs. Collision checks should
+        pass hit_start, so that something standing on a wall can't walk
+        through it.
+
+        This is the inner loop of rendering, so nothing is built per ray,
+        everything is kept in locals and the intersection math from
+        Segment.intersection is inlined.
+        """
+        if self.min_cell is None:
+            return
+
+        cells = self.cells
+        size = self.cell_size
+        floor = math.floor
+        inf = math.inf
+        sqrt = math.sqrt
+        low_x, low_y = self.min_cell[0] * size, self.min_cell[1] * size
+        high_x, high_y = (self.max_cell[0] + 1) * size, (self.max_cell[1] + 1) * size
+
+        x1, y1 = x, y
+
+        for ray in range(len(ends_x)):
+            dx, dy = ends_x[ray] - x1, ends_y[ray] - y1
+            length = sqrt(dx * dx + dy * dy)
+
+            # Clip to the occupied area, so rays don't walk through empty space
+            t_start, t_end = 0.0, 1.0
+            if dx != 0:
+                t_low, t_high = (low_x - x1) / dx, (high_x - x1) / dx
+                if t_low > t_high:
+                    t_low, t_high = t_high, t_low
+                t_start, t_end = max(t_start, t_low), min(t_end, t_high)
+            elif x1 < low_x or x1 > high_x:
+                continue
+
+            if dy != 0:
+                t_low, t_high = (low_y - y1) / dy, (high_y - y1) / dy
+                if t_low > t_high:
+                    t_low, t_high = t_high, t_low
+                t_start, t_end = max(t_start, t_low), min(t_end, t_high)
+            elif y1 < low_y or y1 > high_y:
+                continue
+
+            if t_start > t_end:
+                continue
+
+            # Amanatides & Woo style grid traversal, in units of the parametric t
+            cx = floor((x1 + dx * t_start) / size)
+            cy = floor((y1 + dy * t_start) / size)
+
+            if dx != 0:
+                step_x = 1 if dx > 0 else -1
+                t_delta_x = size / abs(dx)
+                t_max_x = ((cx + (step_x > 0)) * size - x1) / dx
+            else:
+                step_x, t_delta_x, t_max_x = 0, inf, inf
+
+            if dy != 0:
+                step_y = 1 if dy > 0 else -1
+                t_delta_y = size / abs(dy)
+                t_max_y = ((cy + (step_y > 0)) * size - y1) / dy
+            else:
+                step_y, t_delta_y, t_max_y = 0, inf, inf
+
+            best_t = inf
+            best = None
+
+            while True:
+                cell_exit = t_max_x if t_max_x < t_max_y else t_max_y
+
+                for entry in cells.get((cx, cy), ()):
+                    x3, y3, x4, y4, _, _ = entry
+
+                    denominator = (y4 - y3) * dx - (x4 - x3) * dy
+                    if denominator == 0:
+                        continue
+
+                    t = ((x3 - x1) * (y4 - y3) - (y3 - y1) * (x4 - x3)) / denominator
+                    u = (-dx * (y3 - y1) + dy * (x3 - x1)) / denominator
+
+                    if (
+                        (0 < t or (t == 0 and hit_start))
+                        and t <= 1
+                        and 0 <= u <= 1
+                        and t < best_t
+                    ):
+                        best_t = t
+                        best = entry
+
+                # Anything in a later cell is further away than this cell's exit
+                if best is not None and best_t <= cell_exit + 0.0000001 / length:
+                    break
+
+                if cell_exit > t_end:
+                    break
+
+                if t_max_x < t_max_y:
+                    cx += step_x
+                    t_max_x += t_delta_x
+                else:
+                    cy += step_y
+                    t_max_y += t_delta_y
+
+            if best is not None:
+                distance[ray] = best_t * length
+                hit_x[ray] = x1 + best_t * dx
+                hit_y[ray] = y1 + best_t * dy
+                segment_id[ray] = best[5]
@@ -1,6 +1,9 @@
 import geometry
 import math
+import pygame
 import pytest
+import random
+import time
 
 import raycasting
 
@@ -198,3 +201,371 @@ def test_camera_ray_intersections():
     for ray, point in camera.rays(10):
         intersections = geometry.intersect_ray(ray, [segment, segment2])
         assert len(intersections) == 2
+
+
+def test_grid_closest_intersection_matches_brute_force():
+    walls = raycasting.make_map("#  #\n # \n#/&`\n")
+    grid = geometry.SegmentGrid()
+    for wall in walls:
+        grid.add(wall)
+
+    for location in (geometry.Point(2.5, 0.5), geometry.Point(-3, 7)):
+        for step in range(64):
+            ray = geometry.Ray(location, step * math.pi / 32)
+            expected = sorted(geometry.intersect_ray(ray, walls), key=lambda m: m[0])
+            actual = grid.closest_intersection(ray.to_segment())
+
+            if len(expected) == 0:
+                assert actual is None
+            else:
+                assert actual[0] == pytest.approx(expected[0][0])
+
+
+def test_grid_registers_diagonals_along_their_length():
+    grid = geometry.SegmentGrid()
+    diagonal = geometry.Segment(geometry.Point(0, 0), geometry.Point(20, 20))
+    grid.add(diagonal)
+
+    # just the cells along the diagonal (and either side of each corner),
+    # not the whole 20 by 20 box
+    assert len(grid.cells) < 4 * 21
+    assert all(abs(cx - cy) <= 1 for cx, cy in grid.cells)
+
+    ray = geometry.Ray(geometry.Point(0, 15.5), math.pi / 2)
+    distance, hit, segment = grid.closest_intersection(ray.to_segment())
+    assert segment == diagonal
+    assert distance == pytest.approx(15.5)
+
+
+def test_camera_try_move_stops_at_walls():
+    scene = raycasting.Scene(raycasting.make_map("###\n# #\n###\n"))
+    camera = raycasting.Camera(geometry.Point(1.5, 2.5), 0, math.pi / 2)
+
+    camera.try_move(0.25, scene)
+    assert camera.location == pytest.approx((1.5, 2.75))
+
+    camera.try_move(0.5, scene)
+    assert camera.location == pytest.approx((1.5, 2.75))
+
+
+def test_camera_try_move_stops_on_walls():
+    scene = raycasting.Scene(raycasting.make_map("####\n#  #\n#  #\n####"))
+
+    # standing right on the left hand wall, facing across the room
+    camera = raycasting.Camera(geometry.Point(1, 3), math.pi / 2, 1)
+
+    camera.try_move(-0.08, scene)
+    assert camera.location == (1, 3)
+
+
+def test_scene_merges_and_splits_walls():
+    def segment(x1, y1, x2, y2):
+        return geometry.Segment(geometry.Point(x1, y1), geometry.Point(x2, y2))
+
+    scene = raycasting.Scene([segment(0, 0, 2, 0), segment(3, 0, 5, 0)])
+
+    # closing the door joins the wall up
+    door = segment(2, 0, 3, 0)
+    scene.add(door)
+    assert set(scene) == {segment(0, 0, 5, 0)}
+
+    # opening it splits the wall back up, and leaves the swung door
+    scene.replace(door, door.rotated(door.start, -math.pi / 2))
+    assert len(scene) == 3
+    assert segment(0, 0, 2, 0) in scene
+    assert segment(3, 0, 5, 0) in scene
+
+    ray = geometry.Ray(geometry.Point(2.5, -1), 0)
+    assert scene.closest_intersection(ray) is None
+
+
+def test_scene_batch_applies_changes_together():
+    def segment(x1, y1, x2, y2):
+        return geometry.Segment(geometry.Point(x1, y1), geometry.Point(x2, y2))
+
+    scene = raycasting.Scene([segment(0, 0, 1, 0)])
+
+    with scene.batch():
+        scene.add(segment(1, 0, 2, 0))
+        scene.add(segment(5, 5, 6, 6))
+        scene.remove(segment(5, 5, 6, 6))
+        assert len(scene) == 1
+
+    assert set(scene) == {segment(0, 0, 2, 0)}
+
+
+def test_scene_removing_overlapping_wall_keeps_map_walls():
+    def segment(x1, y1, x2, y2):
+        return geometry.Segment(geometry.Point(x1, y1), geometry.Point(x2, y2))
+
+    scene = raycasting.Scene([segment(0, 0, 5, 0)])
+
+    # a platform sliding along (and past) a wall
+    platform = segment(1, 0, 2, 0)
+    scene.add(platform)
+    assert set(scene) == {segment(0, 0, 5, 0)}
+
+    scene.replace(platform, platform.translated(geometry.Point(4, 0)))
+    assert set(scene) == {segment(0, 0, 6, 0)}
+
+    scene.remove(platform.translated(geometry.Point(4, 0)))
+    assert set(scene) == {segment(0, 0, 5, 0)}
+
+    # removing a wall that was never added does nothing
+    scene.remove(segment(1, 0, 2, 0))
+    assert set(scene) == {segment(0, 0, 5, 0)}
+
+
+def test_scene_batch_matches_changes_one_at_a_time():
+    def segment(x1, y1, x2, y2):
+        return geometry.Segment(geometry.Point(x1, y1), geometry.Point(x2, y2))
+
+    def changes(scene):
+        scene.remove(segment(7, 7, 8, 8))
+        scene.add(segment(7, 7, 8, 8))
+        scene.add(segment(1, 0, 2, 0))
+        scene.remove(segment(1, 0, 2, 0))
+
+    one_at_a_time = raycasting.Scene([segment(0, 0, 5, 0)])
+    changes(one_at_a_time)
+
+    batched = raycasting.Scene([segment(0, 0, 5, 0)])
+    with batched.batch():
+        changes(batched)
+
+    assert set(batched) == set(one_at_a_time)
+    assert set(batched) == {segment(0, 0, 5, 0), segment(7, 7, 8, 8)}
+
+    # a batch that raises makes none of its changes
+    with pytest.raises(ValueError):
+        with batched.batch():
+            batched.add(segment(9, 9, 10, 9))
+            raise ValueError()
+
+    assert segment(9, 9, 10, 9) not in batched
+
+
+def test_scene_batch_is_no_slower_than_changes_one_at_a_time():
+    # lots of doors each on their own line, so nothing can be shared
+    doors = [
+        geometry.Segment(geometry.Point(i * 2, 0), geometry.Point(i * 2 + 1, i / 400))
+        for i in range(400)
+    ]
+
+    def one_at_a_time():
+        scene = raycasting.Scene()
+        for door in doors:
+            scene.add(door)
+
+    def batched():
+        scene = raycasting.Scene()
+        with scene.batch():
+            for door in doors:
+                scene.add(door)
+
+    def best_time(function):
+        times = []
+        for _ in range(3):
+            start = time.process_time()
+            function()
+            times.append(time.process_time() - start)
+        return min(times)
+
+    # with a little slack for timing noise
+    assert best_time(batched) <= best_time(one_at_a_time) * 1.25
+
+
+def test_camera_ray_ends_match_rays():
+    camera = raycasting.Camera(geometry.Point(10, 5), math.pi / 3, math.pi / 4)
+
+    for planar_projection in (True, False):
+        camera.planar_projection = planar_projection
+
+        table = camera.column_table(16)
+
+        for (ray, _), x2, y2, cos_offset in zip(
+            camera.rays(16), *camera.ray_ends(table), table[1]
+        ):
+            segment = ray.to_segment()
+            assert x2 == pytest.approx(segment.end.x)
+            assert y2 == pytest.approx(segment.end.y)
+            assert cos_offset == pytest.approx(math.cos(camera.direction - ray.angle))
+
+
+def test_render_views_matches_single_views():
+    scene = raycasting.Scene(raycasting.make_map("####\n#  #\n# /#\n####\n"))
+    views = [
+        (raycasting.Camera(geometry.Point(1.5, 2.5), math.pi / 2, math.pi / 2), 40, 30),
+        (raycasting.Camera(geometry.Point(2.5, 3.5), math.pi, math.pi / 3), 25, 20),
+    ]
+
+    depths = raycasting.render_views(scene, views, depth_only=True)
+    assert [len(depth) for depth in depths] == [40, 25]
+    assert depths[0].typecode == "f"
+
+    for view, depth in zip(views, depths):
+        assert list(depth) == list(
+            raycasting.render_views(scene, [view], depth_only=True)[0]
+        )
+        assert all(0 < distance < 4 for distance in depth)
+
+    surfaces = raycasting.render_views(scene, views)
+    assert [surface.get_size() for surface in surfaces] == [(40, 30), (25, 20)]
+
+
+def test_cast_views_shares_column_tables(monkeypatch):
+    scene = raycasting.Scene(raycasting.make_map("####\n#  #\n# /#\n####\n"))
+    views = [
+        (raycasting.Camera(geometry.Point(1.5, 2.5), direction, math.pi / 2), 32)
+        for direction in (0, 1, 2)
+    ]
+    views.append((raycasting.Camera(geometry.Point(2.5, 2.5), 0, math.pi / 3), 32))
+
+    calls = []
+    column_table = raycasting.Camera.column_table
+
+    def counted(camera, count):
+        calls.append(count)
+        return column_table(camera, count)
+
+    monkeypatch.setattr(raycasting.Camera, "column_table", counted)
+
+    depths = raycasting.cast_views(scene, views, depth_only=True)
+
+    # one table for the three matching views, one for the odd one out
+    assert len(calls) == 2
+    assert [list(depth) for depth in depths] == [
+        list(raycasting.cast_views(scene, [view], depth_only=True)[0]) for view in views
+    ]
+
+
+def test_camera_sense_matches_render():
+    scene = raycasting.Scene(raycasting.make_map("####\n#  #\n# /#\n####\n"))
+    camera = raycasting.Camera(geometry.Point(1.5, 2.5), math.pi / 2, math.pi / 2)
+
+    sweep = camera.sense(scene, 32)
+    depth = raycasting.render_views(scene, [(camera, 32, 10)], depth_only=True)[0]
+
+    assert sweep.distance.typecode == "f"
+    assert list(sweep.distance) == list(depth)
+    assert all(id_ >= 0 for id_ in sweep.segment_id)
+
+    for x, y, id_ in zip(sweep.hit_x, sweep.hit_y, sweep.segment_id):
+        assert scene.wall(id_).in_bounds(geometry.Point(x, y))
+
+    # ids are only good until the walls they hit are rebuilt
+    wall = scene.wall(sweep.segment_id[0])
+    scene.add(geometry.Segment(wall.end, wall.end + (wall.end - wall.start)))
+    assert scene.wall(sweep.segment_id[0]) is None
+
+
+def test_camera_sense_touching_wall_matches_render():
+    scene = raycasting.Scene(raycasting.make_map("####\n#  #\n#  #\n####\n"))
+
+    # standing right on the left hand wall, looking along it and into the room
+    camera = raycasting.Camera(geometry.Point(1, 2), 0, math.pi)
+
+    sweep = camera.sense(scene, 16)
+    depth = raycasting.render_views(scene, [(camera, 16, 10)], depth_only=True)[0]
+
+    assert list(sweep.distance) == list(depth)
+    assert all(distance > 0 for distance in sweep.distance)
+
+
+def test_camera_column_tables_are_cached():
+    first = raycasting.Camera(geometry.Point(1.5, 2.5), 0, math.pi / 2)
+    second = raycasting.Camera(geometry.Point(7, 3), 1, math.pi / 2)
+
+    # so sensor sweeps in a loop don't redo the trig every time
+    assert first.column_table(64) is second.column_table(64)
+
+    second.planar_projection = False
+    assert first.column_table(64) is not second.column_table(64)
+
+
+def test_camera_sense_range_and_noise():
+    scene = raycasting.Scene(raycasting.make_map("####\n#  #\n#  #\n####\n"))
+    camera = raycasting.Camera(geometry.Point(1.5, 2.5), 0, math.pi / 8)
+
+    # the wall ahead is half a unit away
+    sweep = camera.sense(scene, 4, max_range=0.25)
+    assert list(sweep.segment_id) == [-1] * 4
+    assert all(math.isinf(distance) for distance in sweep.distance)
+    assert all(math.isnan(x) for x in sweep.hit_x)
+
+    exact = camera.sense(scene, 4)
+    noisy = camera.sense(scene, 4, noise=0.01, rng=random.Random(4))
+    assert list(noisy.distance) != list(exact.distance)
+    assert list(noisy.distance) == pytest.approx(list(exact.distance), abs=0.1)
+
+
+def test_column_cache_evicts_least_recently_used():
+    texture = raycasting.make_brick_texture(8)
+    bytes_per_pixel = texture.get_bytesize()
+    cache = raycasting.ColumnCache(max_bytes=30 * bytes_per_pixel)
+
+    first = cache.column(texture, 0, 10)
+    assert first.get_size() == (1, 10)
+    assert cache.column(texture, 0, 10) is first
+
+    cache.column(texture, 1, 10)
+    cache.column(texture, 0, 10)
+    cache.column(texture, 2, 10)
+    cache.column(texture, 3, 10)
+
+    # column 1 was the least recently used
+    assert len(cache) == 3
+    assert cache.bytes == 30 * bytes_per_pixel
+    assert (texture, 1, (0, 8), 10) not in cache.columns
+    assert cache.column(texture, 0, 10) is first
+
+
+def test_textured_columns_sample_by_hit_position():
+    texture = pygame.Surface((2, 4))
+    texture.fill((255, 0, 0), (0, 0, 1, 4))
+    texture.fill((0, 0, 255), (1, 0, 1, 4))
+
+    # whichever way round the wall is, which can change when it's rebuilt
+    for wall in (
+        geometry.Segment(geometry.Point(0, 0), geometry.Point(3, 0)),
+        geometry.Segment(geometry.Point(3, 0), geometry.Point(0, 0)),
+    ):
+        columns = [
+            (1.0, geometry.Point(0.25, 0), wall),
+            (1.0, geometry.Point(1.75, 0), wall),
+            None,
+        ]
+
+        surface = pygame.Surface((3, 20))
+        raycasting.draw_textured_columns(
+            surface, columns, 20, texture, raycasting.ColumnCache()
+        )
+
+        assert surface.get_at((0, 10))[:3] == (255, 0, 0)
+        assert surface.get_at((1, 10))[:3] == (0, 0, 255)
+        assert surface.get_at((2, 10))[:3] == (0, 0, 0)
+
+
+def test_textured_columns_crop_close_walls():
+    # one texel wide, with a different colour in each row
+    colours = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+    texture = pygame.Surface((1, 4))
+    for row, colour in enumerate(colours):
+        texture.set_at((0, row), colour)
+
+    # a wall four times taller than the screen, so only the middle half of
+    # the texture (rows 1 and 2) should be seen, at full size
+    wall = geometry.Segment(geometry.Point(0, 0), geometry.Point(1, 0))
+    columns = [(0.75 / 4, geometry.Point(0.5, 0), wall)]
+
+    surface = pygame.Surface((1, 20))
+    cache = raycasting.ColumnCache()
+    raycasting.draw_textured_columns(surface, columns, 20, texture, cache)
+
+    assert [surface.get_at((0, y))[:3] for y in (0, 9)] == [colours[1]] * 2
+    assert [surface.get_at((0, y))[:3] for y in (10, 19)] == [colours[2]] * 2
+
+    # however close the wall gets, the cached columns stay a bounded size
+    columns = [(0.000001, geometry.Point(0.5, 0), wall)]
+    raycasting.draw_textured_columns(surface, columns, 20, texture, cache)
+    assert all(column.get_height() <= 3 * 20 for column in cache.columns.values())
@@ -1,8 +1,27 @@
+import array
+import collections
+import contextlib
+import functools
 import pygame
+import random
 import time
+import typing
 from geometry import *
 
 
+class SensorSweep(typing.NamedTuple):
+    # One entry per beam. Beams that hit nothing have an infinite distance,
+    # a NaN hit point and a segment id of -1.
+    #
+    # Segment ids are looked up with Scene.wall, and are only good until the
+    # scene next changes, as changing a wall rebuilds the merged walls on
+    # its line with new ids.
+    distance: array.array
+    hit_x: array.array
+    hit_y: array.array
+    segment_id: array.array
+
+
 class Camera:
     def __init__(self, location: Point, direction, viewing_angle):
         self.location = location
@@ -10,14 +29,14 @@ class Camera:
         self.viewing_angle = viewing_angle
         self.planar_projection = True
 
-    def try_move(self, distance, walls):
+    def try_move(self, distance, scene):
         new_location = self.location + Point(
             distance * math.sin(self.direction), distance * math.cos(self.direction)
         )
 
         proposed_move = Segment(self.location, new_location)
 
-        if len(intersecting_segments(proposed_move, walls)) == 0:
+        if scene.index.closest_intersection(proposed_move, hit_start=True) is None:
             # we don't intersect any wall, so we allow the move
             self.location = new_location
 
@@ -68,6 +87,111 @@ class Camera:
                     self.location, start_angle + current * angle_slice
                 ), self.location
 
+    def sense(
+        self,
+        scene,
+        beams,
+        max_range=None,
+        noise=0.0,
+        rng: random.Random = None,
+        fisheye_distance_correction=True,
+    ) -> SensorSweep:
+        """
+        Distance sensor (simulated lidar) reading across the camera's view,
+        without drawing anything.
+
+        Beams are spread like the columns of a render, so turn off
+        planar_projection for evenly spaced angles. Walls beyond max_range
+        aren't seen, and noise is the standard deviation of gaussian noise
+        added to each distance.
+        """
+        distance = array.array("f", [math.inf]) * beams
+        hit_x = array.array("f", [math.nan]) * beams
+        hit_y = array.array("f", [math.nan]) * beams
+        segment_id = array.array("i", [-1]) * beams
+
+        table = self.column_table(beams)
+        ends_x, ends_y = self.ray_ends(
+            table, DISTANT_POINT if max_range is None else max_range
+        )
+        scene.index.cast_into(
+            self.location.x,
+            self.location.y,
+            ends_x,
+            ends_y,
+            distance,
+            hit_x,
+            hit_y,
+            segment_id,
+        )
+
+        if fisheye_distance_correction or noise:
+            cos_offsets = table[1]
+            gauss = (rng or random).gauss
+
+            for beam in range(beams):
+                if segment_id[beam] == -1:
+                    continue
+                if fisheye_distance_correction:
+                    distance[beam] *= cos_offsets[beam]
+                if noise:
+                    distance[beam] = max(0.0, gauss(distance[beam], noise))
+
+        return SensorSweep(distance, hit_x, hit_y, segment_id)
+
+    def column_table(self, count):
+        """
+        The sin and cos of each column's ray angle away from the camera
+        direction, as arrays. These only depend on the count, viewing angle
+        and projection, so they're cached and shared between cameras, and
+        mustn't be changed.
+        """
+        return column_table(count, self.viewing_angle, self.planar_projection)
+
+    def ray_ends(self, table, distance=DISTANT_POINT):
+        """
+        The ends of the same rays as `rays`, as (ends_x, ends_y) arrays for
+        casting many at once, turning a column_table to face the camera
+        direction
+        """
+        x, y = self.location.x, self.location.y
+        sin_d = math.sin(self.direction) * distance
+        cos_d = math.cos(self.direction) * distance
+        sin_o, cos_o = table
+
+        ends_x = array.array("d", [0.0]) * len(sin_o)
+        ends_y = array.array("d", [0.0]) * len(sin_o)
+        for i, sin_offset, cos_offset in zip(range(len(sin_o)), sin_o, cos_o):
+            ends_x[i] = x + sin_d * cos_offset + cos_d * sin_offset
+            ends_y[i] = y + cos_d * cos_offset - sin_d * sin_offset
+
+        return ends_x, ends_y
+
+
+@functools.lru_cache(maxsize=64)
+def column_table(count, viewing_angle, planar_projection):
+    half = viewing_angle / 2
+
+    if planar_projection:
+        # Same viewing plane as `Camera.rays`, for a camera facing along the y-axis
+        plane_x, plane_y = math.sin(-half), math.cos(-half)
+        d_x = (math.sin(half) - plane_x) / count
+        d_y = (math.cos(half) - plane_y) / count
+
+        offsets = [
+            -math.atan2(plane_y + (d_y * current), plane_x + (d_x * current))
+            + math.pi / 2
+            for current in range(count)
+        ]
+    else:
+        angle_slice = viewing_angle / count
+        offsets = [-half + current * angle_slice for current in range(count)]
+
+    return (
+        array.array("d", map(math.sin, offsets)),
+        array.array("d", map(math.cos, offsets)),
+    )
+
 
 def box(ul: Point):
     return [
@@ -194,6 +318,198 @@ def make_map(map_string):
     return result
 
 
+class Scene:
+    """
+    The walls of a map, which can be changed at runtime (doors, moving
+    platforms, etc).
+
+    The scene remembers every wall added to it (with a count, so the same
+    wall can be added twice), and draws them merged the same way `make_map`
+    merges them. When a wall is added or removed, only the merged walls on
+    its line that it overlaps or touches are rebuilt, so the cost of a change
+    doesn't depend on the size of the map. It does grow with the length of
+    those merged walls though, so a door in a very long wall costs more than
+    one standing on its own. Removing a wall only takes away what adding it
+    put in, walls that overlap it are left as they were.
+    """
+
+    def __init__(self, walls=(), cell_size=1.0):
+        self.index = SegmentGrid(cell_size)
+        self.sources = collections.Counter()
+        self.source_index = SegmentGrid(cell_size)
+        self._pending = None
+
+        # walls are assumed to already be merged, as returned by make_map
+        for wall in walls:
+            self.sources[wall] += 1
+            self.source_index.add(wall)
+            self.index.add(wall)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __contains__(self, segment):
+        return segment in self.index
+
+    def add(self, segment: Segment):
+        if segment.start == segment.end:
+            raise RuntimeError("Cannot add a wall with identical segment points")
+
+        if self._pending is not None:
+            self._pending.append((True, segment))
+        else:
+            self._apply([(True, segment)])
+
+    def remove(self, segment: Segment):
+        # Removing a wall that was never added does nothing
+        if self._pending is not None:
+            self._pending.append((False, segment))
+        else:
+            self._apply([(False, segment)])
+
+    def replace(self, old: Segment, new: Segment):
+        self.remove(old)
+        self.add(new)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Hold back changes until the end of the block, then make them all at
+        once, with the same result as making them one at a time. If the
+        block raises, none of its changes are made.
+        """
+        if self._pending is not None:
+            # Nested batches are part of the outer one
+            yield self
+            return
+
+        pending = self._pending = []
+        try:
+            yield self
+        finally:
+            self._pending = None
+
+        self._apply(pending)
+
+    def closest_intersection(self, ray: Ray):
+        return self.index.closest_intersection(ray.to_segment())
+
+    def wall(self, segment_id) -> Segment | None:
+        """
+        The merged wall with an id from a SensorSweep, or None if it has been
+        rebuilt or removed since
+        """
+        return self.index.by_id.get(segment_id)
+
+    def _apply(self, changes):
+        changed = {}
+
+        for adding, segment in changes:
+            if adding:
+                self.sources[segment] += 1
+                self.source_index.add(segment)
+            elif self.sources[segment] > 0:
+                self.sources[segment] -= 1
+                if self.sources[segment] == 0:
+                    del self.sources[segment]
+                    self.source_index.remove(segment)
+            else:
+                continue
+
+            changed[segment] = True
+
+        # Changes on the same stretch of wall only need rebuilding once. The
+        # walls already merged are kept in a set and the spans rebuilt by
+        # line, so checking doesn't get slower as the batch gets bigger.
+        merged = set()
+        rebuilt = collections.defaultdict(list)
+        for segment in changed:
+            if segment in merged:
+                continue
+
+            spans = rebuilt[segment.line()]
+            if not any(span.contains(segment) for span in spans):
+                span, sources = self._rebuild(segment)
+                spans.append(span)
+                merged.update(sources)
+
+    def _rebuild(self, segment: Segment):
+        """
+        Re-merge the walls on `segment`'s line that overlap or touch it (and
+        the walls touching those, and so on), returning the span rebuilt and
+        the walls merged into it
+        """
+
+        def along(t):
+            return Point(
+                segment.start.x + (segment.end.x - segment.start.x) * t,
+                segment.start.y + (segment.end.y - segment.start.y) * t,
+            )
+
+        def touching(ends, low, high):
+            return ends[2] >= low - 0.0000001 and ends[0] <= high + 0.0000001
+
+        def ends_of(wall):
+            start, end = segment.project(wall.start), segment.project(wall.end)
+            if start <= end:
+                return start, wall.start, end, wall.end
+            return end, wall.end, start, wall.start
+
+        sources = {}
+        low, high = 0.0, 1.0
+        unsearched = [(low, high)]
+
+        # Each pass only looks in the cells the span has just grown into
+        while unsearched:
+            found = set()
+            for start, end in unsearched:
+                found.update(self.source_index.near(Segment(along(start), along(end))))
+
+            searched_low, searched_high = low, high
+            for source in found:
+                if source in sources or not segment.collinear(source):
+                    continue
+
+                ends = ends_of(source)
+                if touching(ends, low, high):
+                    sources[source] = ends
+                    low, high = min(low, ends[0]), max(high, ends[2])
+
+            unsearched = []
+            if low < searched_low:
+                unsearched.append((low, searched_low))
+            if high > searched_high:
+                unsearched.append((searched_high, high))
+
+        span = Segment(along(low), along(high))
+
+        for wall in self.index.near(span):
+            if segment.collinear(wall) and touching(ends_of(wall), low, high):
+                self.index.remove(wall)
+
+        # Join up overlapping and touching walls into runs along the line
+        runs = []
+        for source, (start, start_point, end, end_point) in sorted(
+            sources.items(), key=lambda item: item[1][0]
+        ):
+            if runs and start <= runs[-1][2] + 0.0000001:
+                if end > runs[-1][2]:
+                    runs[-1] = (runs[-1][0], runs[-1][1], end, end_point, None)
+            else:
+                runs.append((start, start_point, end, end_point, source))
+
+        for _, start_point, _, end_point, source in runs:
+            # A wall on its own keeps its own direction
+            self.index.add(
+                source if source is not None else Segment(start_point, end_point)
+            )
+
+        return span, sources
+
+
 #
 # Symbols:
 #
@@ -243,8 +559,301 @@ class Map2D:
             pygame.draw.line(surface, (255, 255, 255), start, end)
 
 
-def main():
-    game_map = """
+def cast_views(scene: Scene, views, fisheye_distance_correction=True, depth_only=False):
+    """
+    Cast every column of each (camera, width) in `views`, sharing the
+    scene's index, column tables and scratch space between them.
+
+    Each view's rays are still cast on their own, so this only saves the
+    per-view setup, and isn't noticeably faster per ray than casting the
+    views one at a time (see benchmark.py). It's just the one call for
+    everything that needs rendering this tick.
+
+    Returns one list per view, holding the closest
+    (corrected_distance, hit, segment) for each column, or None where no
+    wall was hit. With depth_only, each view is instead a float32
+    array.array of the corrected distances (inf where no wall), without
+    building anything per column.
+
+    Views with the same width, viewing angle and projection share their
+    column table, so only the first of them pays for the trig.
+    """
+    tables = {}
+    result = []
+
+    # Scratch space for the hits, shared by every view
+    widest = max((width for _, width in views), default=0)
+    hit_x = array.array("d", [0.0]) * widest
+    hit_y = array.array("d", [0.0]) * widest
+    segment_id = array.array("q", [-1]) * widest
+
+    for camera, width in views:
+        key = (width, camera.viewing_angle, camera.planar_projection)
+        table = tables.get(key)
+        if table is None:
+            table = tables[key] = camera.column_table(width)
+
+        cos_offsets = table[1]
+        ends_x, ends_y = camera.ray_ends(table)
+
+        distance = array.array("f" if depth_only else "d", [math.inf]) * width
+        segment_id[:width] = array.array("q", [-1]) * width
+
+        scene.index.cast_into(
+            camera.location.x,
+            camera.location.y,
+            ends_x,
+            ends_y,
+            distance,
+            hit_x,
+            hit_y,
+            segment_id,
+        )
+
+        # Distance correction from https://gamedev.stackexchange.com/questions/45295/raycasting-fisheye-effect-question
+        if fisheye_distance_correction:
+            for col in range(width):
+                if segment_id[col] != -1:
+                    distance[col] *= cos_offsets[col]
+
+        if depth_only:
+            result.append(distance)
+            continue
+
+        by_id = scene.index.by_id
+        result.append(
+            [
+                (
+                    None
+                    if segment_id[col] == -1
+                    else (
+                        distance[col],
+                        Point(hit_x[col], hit_y[col]),
+                        by_id[segment_id[col]],
+                    )
+                )
+                for col in range(width)
+            ]
+        )
+
+    return result
+
+
+def draw_columns(surface, columns, height) -> None:
+    last_match = None
+    last_wall = None
+
+    for col, column in enumerate(columns):
+        if column is not None:
+            corrected_distance, _, segment = column
+
+            wall_height = (height * 0.75) / corrected_distance
+            if wall_height > height:
+                wall_height = height + 2
+
+            wall_start = (height - wall_height) / 2
+            wall_end = wall_start + wall_height
+
+            # Draw edge if detected
+            if last_match is not segment and col != 0:
+                if last_match is None:
+                    pygame.draw.line(
+                        surface,
+                        (255, 255, 255),
+                        (col, wall_start),
+                        (col, wall_end),
+                    )
+                else:
+                    pygame.draw.line(
+                        surface,
+                        (255, 255, 255),
+                        (col, min(wall_start, last_wall[0])),
+                        (col, max(wall_end, last_wall[1])),
+                    )
+            else:
+                # draw just top and bottom points otherwise
+                surface.set_at((col, int(wall_start)), (255, 255, 255))
+                surface.set_at((col, int(wall_end)), (255, 255, 255))
+
+                # and some texture...
+                texture_size = max(1, int(height / 50))
+                if col % texture_size == 0:
+                    for y in range(int(wall_start), int(wall_end), texture_size):
+                        surface.set_at((col, y), (255, 255, 255))
+
+            last_wall = (wall_start, wall_end)
+            last_match = segment
+        else:
+            # Look for transition from wall to empty space, draw edge
+            if last_match is not None:
+                pygame.draw.line(
+                    surface,
+                    (255, 255, 255),
+                    (col, last_wall[0]),
+                    (col, last_wall[1]),
+                )
+            last_match = None
+
+
+def make_brick_texture(size=64):
+    texture = pygame.Surface((size, size))
+    texture.fill((150, 60, 40))
+
+    mortar = (200, 200, 190)
+    brick_height = size // 4
+
+    for row in range(4):
+        y = row * brick_height
+        pygame.draw.line(texture, mortar, (0, y), (size - 1, y), 2)
+
+        # every other row of bricks is offset by half a brick
+        offset = (size // 4) * (row % 2)
+        for x in range(offset, size, size // 2):
+            pygame.draw.line(texture, mortar, (x, y), (x, y + brick_height - 1), 2)
+
+    return texture
+
+
+class ColumnCache:
+    """
+    Single pixel wide columns of textures, already scaled to a wall height.
+
+    Keyed by texture, u bucket (the texture column), the range of texels
+    used and the height, with the least recently used columns thrown away
+    once they take up more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.columns = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.columns)
+
+    def column(self, texture, u_bucket, height, texels=None):
+        # texels is the (first, last) rows of the texture to use, for walls
+        # too close to fit on screen, otherwise the whole column is used
+        if texels is None:
+            texels = (0, texture.get_height())
+
+        key = (texture, u_bucket, texels, height)
+        column = self.columns.get(key)
+
+        if column is not None:
+            self.columns.move_to_end(key)
+            return column
+
+        first, last = texels
+        column = pygame.transform.scale(
+            texture.subsurface((u_bucket, first, 1, last - first)), (1, height)
+        )
+        self.columns[key] = column
+        self.bytes += height * column.get_bytesize()
+
+        while self.bytes > self.max_bytes and len(self.columns) > 1:
+            _, evicted = self.columns.popitem(last=False)
+            self.bytes -= evicted.get_height() * evicted.get_bytesize()
+
+        return column
+
+
+def draw_textured_columns(surface, columns, height, texture, cache: ColumnCache):
+    texture_width, texture_height = texture.get_size()
+    blits = []
+
+    for col, column in enumerate(columns):
+        if column is None:
+            continue
+
+        corrected_distance, hit, segment = column
+
+        # The texture repeats every map unit along the wall, so it runs on
+        # across merged walls. It's measured from the wall's lowest end in
+        # (x, y) order rather than its start, as rebuilding a merged wall can
+        # flip it around, which would mirror the texture.
+        u = math.dist(min(segment.start, segment.end), hit) % 1.0
+        u_bucket = min(int(u * texture_width), texture_width - 1)
+
+        wall_height = (height * 0.75) / corrected_distance
+
+        if wall_height <= height:
+            blits.append(
+                (
+                    cache.column(texture, u_bucket, max(1, int(wall_height))),
+                    (col, int((height - wall_height) / 2)),
+                )
+            )
+            continue
+
+        # Only the middle of the wall is on screen, so only the texels that
+        # can be seen are scaled. Once a single texel is taller than the
+        # screen there's nothing more to see, which keeps the cache bounded.
+        wall_height = min(wall_height, texture_height * height)
+        wall_start = (height - wall_height) / 2
+        texel_height = wall_height / texture_height
+
+        first = int(-wall_start / texel_height)
+        last = min(texture_height, math.ceil((height - wall_start) / texel_height))
+
+        blits.append(
+            (
+                cache.column(
+                    texture,
+                    u_bucket,
+                    round((last - first) * texel_height),
+                    (first, last),
+                ),
+                (col, round(wall_start + first * texel_height)),
+            )
+        )
+
+    surface.blits(blits, doreturn=False)
+
+
+def render_views(
+    scene: Scene,
+    views,
+    fisheye_distance_correction=True,
+    depth_only=False,
+    texture=None,
+    column_cache: ColumnCache = None,
+):
+    """
+    Render each (camera, width, height) in `views`, such as split-screen
+    players or off-screen agent cameras, casting them with cast_views.
+
+    Returns a pygame.Surface per view, or with depth_only a float32
+    array.array of the corrected distance per column (inf where no wall).
+    Walls are drawn with `texture` if given, sharing `column_cache` between
+    views.
+    """
+    all_columns = cast_views(
+        scene,
+        [(camera, width) for camera, width, _ in views],
+        fisheye_distance_correction,
+        depth_only,
+    )
+
+    if depth_only:
+        return all_columns
+
+    result = []
+    for (_, width, height), columns in zip(views, all_columns):
+        surface = pygame.Surface((width, height))
+        if texture is not None:
+            if column_cache is None:
+                column_cache = ColumnCache()
+            draw_textured_columns(surface, columns, height, texture, column_cache)
+        else:
+            draw_columns(surface, columns, height)
+        result.append(surface)
+
+    return result
+
+
+# The map used by the demo in main, and by benchmark.py
+GAME_MAP = """
     ###########`&#######
     #           ` / /  #
     #/%#/&`&/&`& % `%`&#
@@ -259,7 +868,13 @@ def main():
     ####################
     """
 
-    map_wall_segments = make_map(game_map)
+
+def main(export_ring=None):
+    """
+    export_ring is an optional frame_ring.FrameRingWriter, sized to the
+    1280x480 window, that every rendered frame is exported to
+    """
+    scene = Scene(make_map(GAME_MAP))
 
     pygame.init()
 
@@ -278,6 +893,10 @@ def main():
 
     fisheye_distance_correction = True
     minimap_on = True
+    textures_on = False
+
+    texture = make_brick_texture()
+    column_cache = ColumnCache()
 
     while True:
         pygame.display.get_surface().fill((0, 0, 0))
@@ -292,6 +911,9 @@ def main():
                 f"{10 / elapsed} fps ({camera.location.x},{camera.location.y}) {camera.direction}"
             )
 
+            if export_ring is not None:
+                print(f"{export_ring.dropped} frames dropped by export")
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
@@ -302,96 +924,30 @@ def main():
                     fisheye_distance_correction = not fisheye_distance_correction
                 if event.key == pygame.K_m:
                     minimap_on = not minimap_on
+                if event.key == pygame.K_t:
+                    textures_on = not textures_on
 
         keys = pygame.key.get_pressed()
 
         if keys[pygame.K_UP]:
-            camera.try_move(0.08, map_wall_segments)
+            camera.try_move(0.08, scene)
         if keys[pygame.K_DOWN]:
-            camera.try_move(-0.08, map_wall_segments)
+            camera.try_move(-0.08, scene)
         if keys[pygame.K_RIGHT]:
             camera.rotate(math.pi / 60)
         if keys[pygame.K_LEFT]:
             camera.rotate(-math.pi / 60)
 
-        col = 0
-
-        last_match = None
-        last_wall = None
-
-        for r, segment_point in camera.rays(width):
-            matches = intersect_ray(r, map_wall_segments)
-
-            def sort_criteria(line):
-                return line[0]
-
-            # sort by closest, and draw it
-            matches.sort(key=sort_criteria, reverse=False)
-
-            # only draw the closest wall.
-            if len(matches) > 0 and matches[0][0] != 0:
-                distance_from_eye = matches[0][0]
-
-                # Distance correction from https://gamedev.stackexchange.com/questions/45295/raycasting-fisheye-effect-question
-                corrected_distance = (
-                    distance_from_eye * math.cos(camera.direction - r.angle)
-                    if fisheye_distance_correction
-                    else distance_from_eye
-                )
-
-                wall_height = (height * 0.75) / corrected_distance
-                if wall_height > height:
-                    wall_height = height + 2
-
-                wall_start = (height - wall_height) / 2
-                wall_end = wall_start + wall_height
-
-                # Draw edge if detected
-                if last_match is not matches[0][2] and col != 0:
-                    if last_match is None:
-                        pygame.draw.line(
-                            pygame.display.get_surface(),
-                            (255, 255, 255),
-                            (col, wall_start),
-                            (col, wall_end),
-                        )
-                    else:
-                        pygame.draw.line(
-                            pygame.display.get_surface(),
-                            (255, 255, 255),
-                            (col, min(wall_start, last_wall[0])),
-                            (col, max(wall_end, last_wall[1])),
-                        )
-                else:
-                    # draw just top and bottom points otherwise
-                    screen.set_at((col, int(wall_start)), (255, 255, 255))
-                    screen.set_at((col, int(wall_end)), (255, 255, 255))
-
-                    # and some texture...
-                    texture_size = int(height / 50)
-                    if col % texture_size == 0:
-                        for y in range(int(wall_start), int(wall_end), texture_size):
-                            screen.set_at((col, y), (255, 255, 255))
-
-                last_wall = (wall_start, wall_end)
-                last_match = matches[0][2]
-            else:
-                # Look for transition from wall to empty space, draw edge
-                if last_match is not None:
-                    pygame.draw.line(
-                        pygame.display.get_surface(),
-                        (255, 255, 255),
-                        (col, last_wall[0]),
-                        (col, last_wall[1]),
-                    )
-                last_match = None
-
-            col += 1
+        columns = cast_views(scene, [(camera, width)], fisheye_distance_correction)
+        if textures_on:
+            draw_textured_columns(screen, columns[0], height, texture, column_cache)
+        else:
+            draw_columns(screen, columns[0], height)
 
         if minimap_on:
             map_surface = pygame.Surface((map2d.width, map2d.height))
             map2d.center = camera.location
-            map2d.draw_map(map_surface, map_wall_segments)
+            map2d.draw_map(map_surface, scene)
             map2d.draw_camera(map_surface, camera)
             pygame.display.get_surface().blit(
                 map_surface, (width - map2d.width, height - map2d.height)
@@ -399,6 +955,15 @@ def main():
 
         pygame.display.flip()
 
+        # Hand the frame to anything reading from the export ring, this never
+        # waits on a slow reader, and doesn't copy the frame out of the
+        # screen if there's nowhere to put it
+        if export_ring is not None:
+            if export_ring.full:
+                export_ring.drop()
+            else:
+                export_ring.write(pygame.image.tobytes(screen, "RGB"), frame, camera)
+
 
 if __name__ == "__main__":
     main()